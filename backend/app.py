@@ -1,9 +1,14 @@
 import logging
+import os
 import joblib
 import pandas as pd
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from utils.config import SERIALIZED_DIR, DATA_DIR
+from utils.sweep import build_sweep_grid, predict_with_probability, resolve_axes
+from utils.registry import (LoadedVersion, RegistryWatcher, list_versions, load_feature_importance,
+                            load_newest_valid_version, mark_serving)
+from utils.request_decoder import RequestValidationError, parse_json
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -20,49 +25,82 @@ CORS(app, resources={
     }
 })
 
-# Load the model and pipeline artifacts
-try:
+def _load_initial_version() -> LoadedVersion | None:
+    """Load the newest valid registry version, or the unversioned artifacts if nothing was published."""
+    if list_versions():
+        loaded = load_newest_valid_version()
+        if loaded is None:
+            # model.pkl comes from the same training run as LATEST, so it is not a safe fallback
+            logging.error("No published model version passed validation; refusing to serve predictions.")
+            return None
+        logging.info(f"Model version {loaded.version} loaded successfully.")
+        return loaded
+
     model_path = SERIALIZED_DIR / 'model.pkl'
     pipeline_path = SERIALIZED_DIR / 'preprocessing_pipeline.pkl'
-
     if not model_path.exists() or not pipeline_path.exists():
-        model = None
-        pipeline = None
         logging.error("Model or pipeline file not found. Please train the model first using model.py.")
-    else:
-        model = joblib.load(model_path)
-        pipeline = joblib.load(pipeline_path)
-        logging.info("Model, and pipeline loaded successfully.")
+        return None
+    model = joblib.load(model_path)
+    pipeline = joblib.load(pipeline_path)
+    logging.info("Model, and pipeline loaded successfully.")
+    # Unversioned artifacts have no canary rows to verify the fast decoder against
+    return LoadedVersion('unversioned', model, pipeline, {})
+
+def _activate_version(loaded: LoadedVersion) -> None:
+    """Atomically swap the served model; in-flight requests keep the version they started with."""
+    global active_version
+    previous = active_version.version if active_version else None
+    active_version = loaded
+    if loaded.version != 'unversioned':
+        mark_serving(loaded.version)
+    logging.info(f"Now serving model version {loaded.version} (previous: {previous}).")
 
+# Load the model and pipeline artifacts
+active_version = None
+try:
+    initial_version = _load_initial_version()
+    if initial_version is not None:
+        _activate_version(initial_version)
 except Exception as e:
     logging.error(f"Error loading model artifacts or columns: {e}")
-    model = None
-    pipeline = None
+
+# Watch the registry and hot swap newly published versions
+registry_watcher = RegistryWatcher(active_version.version if active_version else None, _activate_version)
+registry_watcher.start()
 
 @app.route('/api/predict', methods=['POST'])
 def predict():
     """API endpoint to make predictions."""
-    if not model or not pipeline:
+    # Take one snapshot so the whole request is served by a single model version
+    current = active_version
+    if current is None:
         return jsonify({"error": "Model or pipeline configuration not loaded. Check server logs."}), 500
+    model, pipeline = current.model, current.pipeline
 
     try:
         # Get data from POST request
-        data = request.get_json(force=True)
-        logging.info(f"Received data for prediction: {data}")
-
-        # Convert data into pandas DataFrame
-        input_df = pd.DataFrame(data)
-
-        logging.info(f"Input DataFrame columns after reordering & selection: {input_df.columns.tolist()}")
-        logging.info(f"Input DataFrame shape: {input_df.shape}")
-
-        # Apply the preprocessing pipeline
-        processed_input = pipeline.transform(input_df)
-
-        # If 'processed_input' is a DataFrame, log its columns
-        if isinstance(processed_input, pd.DataFrame):
-            logging.info(f"Processed DataFrame columns: {processed_input.columns.tolist()}")
-        logging.info(f"Processed data shape for model: {processed_input.shape}")
+        data = parse_json(request.get_data())
+        logging.debug(f"Received data for prediction: {data}")
+
+        if current.decoder is not None:
+            # Fast path: decode JSON straight into feature rows using the fitted vocabularies
+            processed_input = current.decoder.to_frame(current.decoder.decode(data))
+        else:
+            # Convert data into pandas DataFrame
+            input_df = pd.DataFrame(data)
+            logging.debug(f"Input DataFrame columns: {input_df.columns.tolist()}")
+
+            # Apply the preprocessing pipeline
+            processed_input = pipeline.transform(input_df)
+
+            # Align columns with the feature schema the model was trained on
+            feature_columns = current.manifest.get('feature_schema', {}).get('feature_columns')
+            if feature_columns is None:
+                feature_columns = getattr(model, 'feature_names_in_', None)
+            if feature_columns is not None and isinstance(processed_input, pd.DataFrame):
+                processed_input = processed_input[list(feature_columns)]
+        logging.debug(f"Processed data shape for model: {processed_input.shape}")
 
         # Make prediction
         prediction = model.predict(processed_input)
@@ -79,16 +117,58 @@ def predict():
         logging.info(f"Prediction result: {prediction.tolist()}")
 
         # Return prediction as JSON response
-        response_payload = {'prediction': prediction.tolist()}
+        response_payload = {'prediction': prediction.tolist(), 'model_version': current.version}
         if prediction_proba is not None:
             response_payload['prediction_proba_fatal'] = prediction_proba
 
         return jsonify(response_payload)
 
+    except RequestValidationError as e:
+        logging.info(f"Rejected prediction request: {e.errors}")
+        return jsonify({"error": f"Invalid collision input: {e}", "details": e.errors}), 422
+
     except Exception as e:
         logging.error(f"Error during prediction: {e}", exc_info=True)
         return jsonify({"error": f"An error occurred during prediction: {str(e)}"}), 400
 
+@app.route('/api/predict/sweep', methods=['POST'])
+def predict_sweep():
+    """API endpoint to predict fatality risk over a grid of one or two varied inputs."""
+    current = active_version
+    if current is None:
+        return jsonify({"error": "Model or pipeline configuration not loaded. Check server logs."}), 500
+    model, pipeline = current.model, current.pipeline
+
+    try:
+        data = request.get_json(force=True)
+        base = data.get('base') if isinstance(data, dict) else None
+        if not isinstance(base, dict):
+            raise ValueError("Request body must contain a 'base' collision input object.")
+        axes = resolve_axes(base, data.get('axes'), pipeline)
+
+        feature_columns = current.manifest.get('feature_schema', {}).get('feature_columns')
+        if feature_columns is None:
+            feature_columns = list(model.feature_names_in_)
+        grid = build_sweep_grid(base, axes, pipeline, feature_columns)
+        logging.info(f"Sweeping {[field for field, _ in axes]} over {len(grid)} grid points")
+
+        # One batched pass over the ensemble members for the whole grid
+        shape = [len(values) for _, values in axes]
+        prediction, proba = predict_with_probability(model, grid)
+        response_payload = {
+            'model_version': current.version,
+            'axes': [{'field': field, 'values': values} for field, values in axes],
+            'prediction': prediction.reshape(shape).tolist(),
+        }
+        if proba is not None:
+            response_payload['prediction_proba_fatal'] = proba.reshape(shape).tolist()
+
+        return jsonify(response_payload)
+
+    except Exception as e:
+        logging.error(f"Error during sweep prediction: {e}", exc_info=True)
+        return jsonify({"error": f"An error occurred during sweep prediction: {str(e)}"}), 400
+
 @app.route('/api/insights/collisions-by-region', methods=['GET'])
 def get_collisions_by_region():
     """API endpoint to get collision statistics by region."""
@@ -111,11 +191,35 @@ def get_collisions_by_region():
         logging.error(f"Error getting collisions by region: {e}", exc_info=True)
         return jsonify({"error": f"An error occurred while getting collisions by region: {str(e)}"}), 500
 
+@app.route('/api/insights/feature-importance', methods=['GET'])
+def get_feature_importance():
+    """API endpoint to get the cached permutation feature importance of the active model."""
+    current = active_version
+    if current is None:
+        return jsonify({"error": "Model or pipeline configuration not loaded. Check server logs."}), 500
+
+    try:
+        # Computed once at training time and stored with the version; never recomputed here
+        importance = load_feature_importance(current.version)
+        if importance is None:
+            return jsonify({"error": f"No feature importance available for model version {current.version}."}), 404
+        return jsonify({'model_version': current.version, **importance})
+
+    except Exception as e:
+        logging.error(f"Error getting feature importance: {e}", exc_info=True)
+        return jsonify({"error": f"An error occurred while getting feature importance: {str(e)}"}), 500
+
 @app.route('/')
 def health_check():
     """Health check endpoint."""
-    return jsonify({"status": "healthy", "message": "Server is running"})
+    current = active_version
+    return jsonify({
+        "status": "healthy",
+        "message": "Server is running",
+        "model_version": current.version if current else None,
+        "model_created_at": current.manifest.get('created_at') if current else None,
+    })
 
 if __name__ == '__main__':
     # Set debug=False for production environments
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=False)
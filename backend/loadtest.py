@@ -0,0 +1,333 @@
+"""Load-test harness for the Flask API.
+
+Starts app.py locally against the trained artifacts (or targets a running server),
+replays realistic CollisionInput payloads mixed with region insight requests at a
+configurable concurrency and rate, and reports throughput, latency percentiles,
+error rate and server RSS over time. Results are saved as JSON and can be compared
+against a baseline run.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+import numpy as np
+import pandas as pd
+from utils.config import BASE_DIR, COLLISION_INPUT_SCHEMA, DATA_DIR, INSIGHTS_DIR, RANDOM_STATE
+from utils.registry import CANARY_FILE, REGISTRY_DIR, get_latest_version
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover - /proc is used on Linux
+    psutil = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+LOADTEST_DIR = INSIGHTS_DIR / "loadtest"
+PREDICT_PATH = '/api/predict'
+REGION_PATH = '/api/insights/collisions-by-region'
+# Metrics compared against a baseline; higher is better only for throughput
+COMPARED_METRICS = ['throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'error_rate']
+# Absolute error-rate increase counted as a regression
+ERROR_RATE_TOLERANCE = 0.01
+
+def load_payloads(n: int, seed: int) -> list[dict]:
+    """Sample realistic CollisionInput payloads from the dataset, or the model's canary batch."""
+    data_path = DATA_DIR / 'TOTAL_KSI_6386614326836635957.csv'
+    fields = list(COLLISION_INPUT_SCHEMA)
+    if data_path.exists():
+        df = pd.read_csv(data_path, usecols=lambda col: col in COLLISION_INPUT_SCHEMA)
+        df = df.sample(n=min(n, len(df)), random_state=seed)
+        records = json.loads(df[[col for col in fields if col in df.columns]].to_json(orient='records'))
+    else:
+        version = get_latest_version()
+        if version is None:
+            raise FileNotFoundError("No dataset or published model version to take payloads from.")
+        records = json.loads((REGISTRY_DIR / version / CANARY_FILE).read_text())
+    # The frontend sends TIME as an HHMM string
+    for record in records:
+        if record.get('TIME') is not None:
+            record['TIME'] = str(record['TIME']).zfill(4)
+    return records
+
+def _read_rss_mib(pid: int) -> Optional[float]:
+    """Resident set size of a process in MiB."""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss / 2**20
+        except psutil.Error:
+            return None
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+class RssSampler(threading.Thread):
+    """Sample the server's RSS at a fixed interval."""
+
+    def __init__(self, pid: int, interval: float, start_time: float):
+        super().__init__(name='rss-sampler', daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.start_time = start_time
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            rss = _read_rss_mib(self.pid)
+            if rss is not None:
+                self.samples.append([round(time.perf_counter() - self.start_time, 3), round(rss, 1)])
+            self._stop_event.wait(self.interval)
+
+def start_server(port: int, timeout: float) -> subprocess.Popen:
+    """Start app.py on the given port and wait until its health check responds."""
+    env = dict(os.environ, PORT=str(port))
+    process = subprocess.Popen([sys.executable, 'app.py'], cwd=BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"app.py exited with code {process.returncode} during startup")
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1):
+                return process
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    process.terminate()
+    raise TimeoutError(f"app.py did not become healthy within {timeout} seconds")
+
+def _send(base_url: str, path: str, payload: Optional[dict], timeout: float) -> tuple[bool, int]:
+    """Send one request and return (success, status code)."""
+    if payload is None:
+        req = urllib.request.Request(base_url + path, method='GET')
+    else:
+        req = urllib.request.Request(base_url + path, data=json.dumps([payload]).encode(),
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            return True, response.status
+    except urllib.error.HTTPError as e:
+        return False, e.code
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return False, 0
+
+def build_schedule(n_requests: int, region_ratio: float, n_payloads: int, seed: int) -> list[tuple[str, Optional[int]]]:
+    """Deterministic sequence of (path, payload index) for a run."""
+    rng = np.random.default_rng(seed)
+    is_region = rng.random(n_requests) < region_ratio
+    payload_idx = rng.integers(0, n_payloads, n_requests)
+    return [(REGION_PATH, None) if region else (PREDICT_PATH, int(idx))
+            for region, idx in zip(is_region, payload_idx)]
+
+def run_load(base_url: str, schedule: list[tuple[str, Optional[int]]], payloads: list[dict],
+             concurrency: int, rate: float, timeout: float) -> tuple[list[dict], float]:
+    """Replay the schedule and record one result per request.
+
+    With a target rate, requests are sent open-loop at fixed intervals and latency is
+    measured from the scheduled send time, so server stalls show up in the tail instead
+    of silently lowering the offered load.
+    """
+    results = [None] * len(schedule)
+    start = time.perf_counter()
+
+    def worker(i: int) -> None:
+        path, payload_idx = schedule[i]
+        scheduled = start + i / rate if rate > 0 else None
+        if scheduled is not None:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        sent = time.perf_counter()
+        ok, status = _send(base_url, path, payloads[payload_idx] if payload_idx is not None else None, timeout)
+        done = time.perf_counter()
+        results[i] = {
+            'path': path,
+            'ok': ok,
+            'status': status,
+            'latency_ms': (done - (scheduled if scheduled is not None else sent)) * 1000,
+            'finished_at': done - start,
+        }
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(len(schedule))))
+    return results, time.perf_counter() - start
+
+def summarize(results: list[dict], elapsed: float) -> dict:
+    """Throughput, error rate and latency percentiles for a set of results."""
+    if not results:
+        return {'requests': 0}
+    latencies = np.array([r['latency_ms'] for r in results])
+    errors = sum(not r['ok'] for r in results)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'error_rate': errors / len(results),
+        'throughput_rps': len(results) / elapsed,
+        'mean_ms': float(latencies.mean()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(latencies.max()),
+        'status_codes': {str(code): sum(r['status'] == code for r in results)
+                         for code in sorted({r['status'] for r in results})},
+    }
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Log metric deltas against a baseline run and return the regressions beyond threshold."""
+    regressions = []
+    logging.info(f"Comparison against baseline from {baseline.get('started_at')}:")
+    differing = [key for key in ('requests', 'concurrency', 'rate', 'region_ratio', 'seed')
+                 if baseline.get('config', {}).get(key) != current['config'].get(key)]
+    if differing:
+        logging.warning(f"Baseline used a different {', '.join(differing)}; deltas may reflect the load, not the server.")
+    # In open-loop mode throughput follows the offered rate, so it says nothing about the server
+    open_loop = bool(current['config'].get('rate')) or bool(baseline.get('config', {}).get('rate'))
+    for scope, summary in current['summary'].items():
+        base_summary = baseline.get('summary', {}).get(scope)
+        if not base_summary or not summary.get('requests'):
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = base_summary.get(metric), summary.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else (0.0 if new == old else float('inf'))
+            if metric == 'error_rate':
+                worse = new - old > ERROR_RATE_TOLERANCE
+            elif metric == 'throughput_rps':
+                if open_loop:
+                    logging.info(f"  {scope:<10} {metric:<15} {old:>10.3f} -> {new:>10.3f} (set by --rate, not compared)")
+                    continue
+                worse = change < -threshold
+            else:
+                # Lower is better for latencies
+                worse = change > threshold
+            flag = '  REGRESSION' if worse else ''
+            logging.info(f"  {scope:<10} {metric:<15} {old:>10.3f} -> {new:>10.3f} ({change:+.1%}){flag}")
+            if worse:
+                regressions.append(f"{scope}.{metric}")
+    return regressions
+
+def main(args: argparse.Namespace) -> int:
+    payloads = load_payloads(args.payloads, args.seed)
+    logging.info(f"Loaded {len(payloads)} payloads")
+
+    server = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+        server_pid = args.server_pid
+    else:
+        logging.info(f"Starting app.py on port {args.port}...")
+        server = start_server(args.port, args.startup_timeout)
+        base_url = f'http://127.0.0.1:{args.port}'
+        server_pid = server.pid
+
+    try:
+        with urllib.request.urlopen(base_url + '/', timeout=args.timeout) as response:
+            health = json.loads(response.read())
+
+        if args.warmup:
+            logging.info(f"Warming up with {args.warmup} requests...")
+            run_load(base_url, build_schedule(args.warmup, args.region_ratio, len(payloads), args.seed + 1),
+                     payloads, args.concurrency, 0, args.timeout)
+
+        schedule = build_schedule(args.requests, args.region_ratio, len(payloads), args.seed)
+        logging.info(f"Sending {len(schedule)} requests with concurrency {args.concurrency}"
+                     f"{f' at {args.rate} req/s' if args.rate > 0 else ' (closed loop)'}...")
+        sampler = None
+        if server_pid:
+            sampler = RssSampler(server_pid, args.rss_interval, time.perf_counter())
+            sampler.start()
+        started_at = datetime.now(timezone.utc).isoformat()
+        results, elapsed = run_load(base_url, schedule, payloads, args.concurrency, args.rate, args.timeout)
+        if sampler:
+            sampler.stop()
+            sampler.join()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    rss_samples = sampler.samples if sampler else []
+    report = {
+        'started_at': started_at,
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'model_version': health.get('model_version')},
+        'elapsed_s': elapsed,
+        'summary': {
+            'all': summarize(results, elapsed),
+            'predict': summarize([r for r in results if r['path'] == PREDICT_PATH], elapsed),
+            'region': summarize([r for r in results if r['path'] == REGION_PATH], elapsed),
+        },
+        'rss_mib': {
+            'peak': max((rss for _, rss in rss_samples), default=None),
+            'samples': rss_samples,
+        },
+    }
+
+    for scope, summary in report['summary'].items():
+        if summary.get('requests'):
+            logging.info(f"{scope:<8} n={summary['requests']} rps={summary['throughput_rps']:.1f} "
+                         f"p50={summary['p50_ms']:.1f}ms p95={summary['p95_ms']:.1f}ms "
+                         f"p99={summary['p99_ms']:.1f}ms errors={summary['error_rate']:.2%}")
+    if report['rss_mib']['peak'] is not None:
+        logging.info(f"Server peak RSS: {report['rss_mib']['peak']:.1f} MiB")
+
+    output = Path(args.output) if args.output else LOADTEST_DIR / f"loadtest_{datetime.now():%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    logging.info(f"Results saved to {output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(report, baseline, args.regression_threshold)
+        if regressions:
+            logging.warning(f"Regressions beyond {args.regression_threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the collision prediction API.")
+    parser.add_argument('--requests', type=int, default=1000, help="Number of measured requests.")
+    parser.add_argument('--concurrency', type=int, default=8, help="Maximum requests in flight.")
+    parser.add_argument('--rate', type=float, default=0,
+                        help="Target request rate in req/s (open loop); 0 sends as fast as concurrency allows.")
+    parser.add_argument('--region-ratio', type=float, default=0.1,
+                        help="Fraction of requests sent to the collisions-by-region insight endpoint.")
+    parser.add_argument('--warmup', type=int, default=50, help="Unmeasured requests sent before the run.")
+    parser.add_argument('--payloads', type=int, default=500, help="Number of distinct prediction payloads.")
+    parser.add_argument('--seed', type=int, default=RANDOM_STATE, help="Seed for payloads and traffic mix.")
+    parser.add_argument('--timeout', type=float, default=30, help="Per-request timeout in seconds.")
+    parser.add_argument('--port', type=int, default=5055, help="Port for the locally started server.")
+    parser.add_argument('--startup-timeout', type=float, default=120, help="Seconds to wait for app.py to start.")
+    parser.add_argument('--url', help="Target an already running server instead of starting app.py.")
+    parser.add_argument('--server-pid', type=int, help="PID of the server given with --url, to sample its RSS.")
+    parser.add_argument('--rss-interval', type=float, default=0.5, help="Seconds between RSS samples.")
+    parser.add_argument('--output', help="Path of the JSON report (default: insights/loadtest/).")
+    parser.add_argument('--baseline', help="JSON report of a previous run to compare against.")
+    parser.add_argument('--regression-threshold', type=float, default=0.10,
+                        help="Relative change counted as a regression in comparison mode.")
+    sys.exit(main(parser.parse_args()))
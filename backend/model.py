@@ -1,3 +1,4 @@
+import argparse
 import logging
 from typing import Any
 import joblib
@@ -10,70 +11,153 @@ from sklearn.neighbors import KNeighborsClassifier
 from sklearn.pipeline import Pipeline
 #from sklearn.svm import SVC
 from sklearn.tree import DecisionTreeClassifier
-from utils.config import DATA_DIR, RANDOM_STATE, SERIALIZED_DIR, TARGET
+from utils.config import BINARY_COLUMNS, CANARY_SIZE, COLUMNS_TO_DROP, COLUMNS_TO_LABEL_ENCODE, COMPACT_DTYPES, COMPUTE_FEATURE_IMPORTANCE, DATA_DIR, RANDOM_STATE, SERIALIZED_DIR, TARGET, TRACK_MEMORY
 from utils.data_cleaner import DataCleaner
 from utils.evaluation import evaluate_model
 from utils.feature_engineer import FeatureEngineer
+from utils.importance import compute_permutation_importance
+from utils.memory import MemoryTracker
+from utils.registry import publish_version
 from utils.sampling import apply_sampling
+from utils.visualization import plot_feature_importance
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def main():
+def _load_data(compact: bool) -> pd.DataFrame:
+    """Load the raw collision data, skipping dropped columns in compact mode."""
+    data_path = DATA_DIR / 'TOTAL_KSI_6386614326836635957.csv'
+    if not compact:
+        return pd.read_csv(data_path)
+    # DATE and TIME are consumed by the FeatureEngineer before the cleaner drops them
+    feature_sources = {'DATE', 'TIME'}
+    # Low-cardinality string columns are parsed straight into categories, so the cleaner
+    # uppercases and encodes each distinct label instead of every row
+    category_columns = BINARY_COLUMNS + COLUMNS_TO_LABEL_ENCODE + [TARGET]
+    return pd.read_csv(data_path, usecols=lambda col: col not in COLUMNS_TO_DROP or col in feature_sources,
+                       dtype={col: 'category' for col in category_columns})
+
+def _sample_canary(df: pd.DataFrame) -> pd.DataFrame:
+    """Sample raw rows, restricted to request input columns, to validate the model before serving."""
+    input_columns = [col for col in df.columns if col != TARGET and (col not in COLUMNS_TO_DROP or col in ('DATE', 'TIME'))]
+    return df[input_columns].sample(n=min(CANARY_SIZE, len(df)), random_state=RANDOM_STATE).reset_index(drop=True)
+
+def _to_feature_matrix(df: pd.DataFrame, columns: list[str]) -> np.ndarray:
+    """Copy feature columns into a single C-contiguous float32 matrix."""
+    X = np.empty((len(df), len(columns)), dtype=np.float32)
+    for i, col in enumerate(columns):
+        X[:, i] = df[col].to_numpy()
+    return X
+
+def _as_frame(X: np.ndarray, columns: list[str]) -> pd.DataFrame:
+    """Wrap a feature matrix as a DataFrame without copying it, so feature names are kept."""
+    return pd.DataFrame(X, columns=columns, copy=False)
+
+def _prepare_compact(df: pd.DataFrame, preprocessing_pipeline: Pipeline,
+                     memory: MemoryTracker) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, list[str]]:
+    """Preprocess in place and split a single float32 feature matrix into train/test sets."""
+    logging.info("Preprocessing data (compact dtypes)...")
+    with memory.stage('preprocess'):
+        # Both transformers modify the frame in place, so no intermediate copies are made
+        processed_df = preprocessing_pipeline.fit_transform(df)
+
+    if TARGET not in processed_df.columns:
+        raise ValueError(f"Target column '{TARGET}' not found in the processed DataFrame columns: {processed_df.columns.tolist()}")
+    feature_columns = [col for col in processed_df.columns if col != TARGET]
+
+    with memory.stage('feature_matrix'):
+        X = _to_feature_matrix(processed_df, feature_columns)
+        y = processed_df[TARGET].to_numpy(dtype=np.uint8)
+        # Release the frame; only the feature matrix flows through the rest of the pipeline
+        processed_df.drop(processed_df.index, inplace=True)
+        del processed_df
+
+    logging.info(f"Final dataset shape: {X.shape} ({X.nbytes / 2**20:.1f} MiB)")
+    logging.info(f"Number of Fatal accidents: {y.sum()}")
+    logging.info(f"Number of Non-Fatal accidents: {len(y) - y.sum()}")
+
+    with memory.stage('split'):
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, stratify=y, random_state=RANDOM_STATE)
+        del X, y
+    return X_train, X_test, y_train, y_test, feature_columns
+
+def _prepare_default(df: pd.DataFrame, preprocessing_pipeline: Pipeline,
+                     memory: MemoryTracker) -> tuple[pd.DataFrame, pd.DataFrame, pd.Series, pd.Series]:
+    """Preprocess the data and split it into train/test DataFrames."""
+    logging.info("Preprocessing data...")
+    with memory.stage('preprocess'):
+        logging.info("Transforming data using full pipeline...")
+        processed_data_np = preprocessing_pipeline.fit_transform(df)
+    
+        logging.info("Retrieving column names and index before scaling...")
+        temp_df = df
+        processed_columns = None
+        processed_index = None
+        try:
+            # Iterate through steps *before* the scaler ('scaler' is the last step)
+            for name, step in preprocessing_pipeline.steps[:-1]:
+                # Get the already fitted transformer instance from the pipeline
+                fitted_transformer = preprocessing_pipeline.named_steps[name]
+                # Apply transform using the fitted transformer
+                temp_df = fitted_transformer.transform(temp_df)
+                # Ensure temp_df remains a DataFrame to access columns/index easily
+                # Note: Custom transformers FeatureEngineer/DataCleaner must return DataFrames
+                if not isinstance(temp_df, pd.DataFrame):
+                    raise TypeError(f"Intermediate step '{name}' did not return a pandas DataFrame.")
+
+            # After applying steps before the scaler, get columns and index
+            processed_columns = temp_df.columns
+            processed_index = temp_df.index
+        except Exception as e:
+            logging.error(f"Error retrieving column names/index before scaling: {e}")
+            raise RuntimeError("Could not determine column names/index after preprocessing steps before scaler.") from e
+
+        # Create DataFrame from the scaled NumPy array with retrieved columns and index
+        logging.info("Creating final DataFrame from scaled data...")
+        processed_df = pd.DataFrame(processed_data_np, columns=processed_columns, index=processed_index)
+
+        # Optional: Verify TARGET column exists before proceeding
+        if TARGET not in processed_df.columns:
+            raise ValueError(f"Target column '{TARGET}' not found in the processed DataFrame columns: {processed_df.columns.tolist()}")
+        logging.info(f"Shape of final processed DataFrame: {processed_df.shape}")
+    
+        # Seperate features and target variable
+        X = processed_df.drop(columns=[TARGET])
+        y = processed_df[TARGET] 
+
+        logging.info(f"Final dataset shape: {X.shape}")
+        logging.info(f"Number of Fatal accidents: {y.sum()}")
+        logging.info(f"Number of Non-Fatal accidents: {len(y) - y.sum()}")
+
+    with memory.stage('split'):
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, stratify=y, random_state=RANDOM_STATE)
+    return X_train, X_test, y_train, y_test
+
+def main(compact: bool = COMPACT_DTYPES, track_memory: bool = TRACK_MEMORY,
+         compute_importance: bool = COMPUTE_FEATURE_IMPORTANCE):
+    memory = MemoryTracker(enabled=track_memory)
+    memory.start()
+
     # Load your data here
     logging.info("Loading data...")
-    df = pd.read_csv(DATA_DIR / 'TOTAL_KSI_6386614326836635957.csv')
+    with memory.stage('load'):
+        df = _load_data(compact)
+    # Taken before preprocessing, which transforms the frame in place
+    canary_df = _sample_canary(df)
     
     # Create preprocessing pipeline
     preprocessing_pipeline = Pipeline([ 
         ('engineer', FeatureEngineer()),
-        ('cleaner', DataCleaner()),
+        ('cleaner', DataCleaner(compact=compact)),
         #('scaler', StandardScaler())
     ])
-    
-    logging.info("Preprocessing data...")
-    logging.info("Transforming data using full pipeline...")
-    processed_data_np = preprocessing_pipeline.fit_transform(df)
-    
-    logging.info("Retrieving column names and index before scaling...")
-    temp_df = df
-    processed_columns = None
-    processed_index = None
-    try:
-        # Iterate through steps *before* the scaler ('scaler' is the last step)
-        for name, step in preprocessing_pipeline.steps[:-1]:
-            # Get the already fitted transformer instance from the pipeline
-            fitted_transformer = preprocessing_pipeline.named_steps[name]
-            # Apply transform using the fitted transformer
-            temp_df = fitted_transformer.transform(temp_df)
-            # Ensure temp_df remains a DataFrame to access columns/index easily
-            # Note: Custom transformers FeatureEngineer/DataCleaner must return DataFrames
-            if not isinstance(temp_df, pd.DataFrame):
-                raise TypeError(f"Intermediate step '{name}' did not return a pandas DataFrame.")
-
-        # After applying steps before the scaler, get columns and index
-        processed_columns = temp_df.columns
-        processed_index = temp_df.index
-    except Exception as e:
-        logging.error(f"Error retrieving column names/index before scaling: {e}")
-        raise RuntimeError("Could not determine column names/index after preprocessing steps before scaler.") from e
-
-    # Create DataFrame from the scaled NumPy array with retrieved columns and index
-    logging.info("Creating final DataFrame from scaled data...")
-    processed_df = pd.DataFrame(processed_data_np, columns=processed_columns, index=processed_index)
-
-    # Optional: Verify TARGET column exists before proceeding
-    if TARGET not in processed_df.columns:
-        raise ValueError(f"Target column '{TARGET}' not found in the processed DataFrame columns: {processed_df.columns.tolist()}")
-    logging.info(f"Shape of final processed DataFrame: {processed_df.shape}")
-    
-    # Seperate features and target variable
-    X = processed_df.drop(columns=[TARGET])
-    y = processed_df[TARGET] 
 
-    logging.info(f"Final dataset shape: {X.shape}")
-    logging.info(f"Number of Fatal accidents: {y.sum()}")
-    logging.info(f"Number of Non-Fatal accidents: {len(y) - y.sum()}")
+    if compact:
+        X_train, X_test, y_train, y_test, feature_columns = _prepare_compact(df, preprocessing_pipeline, memory)
+        del df
+    else:
+        X_train, X_test, y_train, y_test = _prepare_default(df, preprocessing_pipeline, memory)
+        feature_columns = X_train.columns.tolist()
 
     # Create a list of classifiers.
     classifiers = [
@@ -87,24 +171,52 @@ def main():
     # Create a voting classifier.
     voting_clf = VotingClassifier(estimators=classifiers, voting='hard')
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, stratify=y, random_state=RANDOM_STATE)
-    X_train_resampled, y_train_resampled = apply_sampling(X_train, y_train, method='smote_tomek')
+    with memory.stage('sampling'):
+        X_train_resampled, y_train_resampled = apply_sampling(X_train, y_train, method='smote_tomek')
+        del X_train, y_train
 
     logging.info("Training Voting Classifier...")
-    voting_clf.fit(X_train_resampled, y_train_resampled)
+    with memory.stage('fit'):
+        if compact:
+            # Trees work on float32 natively, so the matrix is used as-is
+            X_train_resampled = _as_frame(X_train_resampled, feature_columns)
+        voting_clf.fit(X_train_resampled, y_train_resampled)
+        del X_train_resampled, y_train_resampled
 
     # Log test set class distribution
     unique, counts = np.unique(y_test, return_counts=True)
     logging.info(f"Test set class distribution: {dict(zip(unique, counts))}")
 
     logging.info("Evaluating model...")
-    evaluate_model(voting_clf, X_test, y_test)  # Evaluate on the original (but scaled) X_test
+    with memory.stage('evaluate'):
+        if compact:
+            X_test = _as_frame(X_test, feature_columns)
+        metrics = evaluate_model(voting_clf, X_test, y_test)  # Evaluate on the original (but scaled) X_test
+
+    feature_importance = None
+    if compute_importance:
+        with memory.stage('importance'):
+            importance_df, importance_summary = compute_permutation_importance(voting_clf, X_test, y_test)
+        plot_feature_importance(importance_df, 'Permutation Feature Importance', 'feature_importance.png')
+        feature_importance = {**importance_summary, 'features': importance_df.to_dict('records')}
 
     # Save the *preprocessing* pipeline and the *trained* model
     joblib.dump(voting_clf, SERIALIZED_DIR / 'model.pkl')
     joblib.dump(preprocessing_pipeline, SERIALIZED_DIR / 'preprocessing_pipeline.pkl')
     logging.info("Model and preprocessing pipeline saved successfully.")
 
+    # Publish a versioned copy for the API to hot reload
+    publish_version(voting_clf, preprocessing_pipeline, metrics, feature_columns, canary_df, feature_importance)
+    memory.stop()
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the collision fatality model.")
+    parser.add_argument('--compact', action=argparse.BooleanOptionalAction, default=COMPACT_DTYPES,
+                        help="Use compact dtypes and a single float32 feature matrix to cut peak memory.")
+    parser.add_argument('--track-memory', action=argparse.BooleanOptionalAction, default=TRACK_MEMORY,
+                        help="Log peak memory for each pipeline stage.")
+    parser.add_argument('--importance', action=argparse.BooleanOptionalAction, default=COMPUTE_FEATURE_IMPORTANCE,
+                        help="Compute permutation feature importance after training.")
+    args = parser.parse_args()
+    main(compact=args.compact, track_memory=args.track_memory, compute_importance=args.importance)
@@ -8,6 +8,7 @@ DATA_DIR = BASE_DIR / "data"
 INSIGHTS_DIR = BASE_DIR / "insights"
 SERIALIZED_DIR = INSIGHTS_DIR / "serialized_artifacts"
 SERIALIZED_DIR.mkdir(parents=True, exist_ok=True)
+REGISTRY_DIR = SERIALIZED_DIR / "registry"
 PERFORMANCE_DIR = INSIGHTS_DIR / "performance"
 PERFORMANCE_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -59,6 +60,25 @@ COLUMNS_TO_LABEL_ENCODE = [
 
 NA_FILL_COLUMNS = ['PEDCOND', 'CYCCOND']
 
+# Prediction request schema, mirroring CollisionInput in frontend/src/types.ts
+COLLISION_INPUT_SCHEMA = {
+    'DATE': 'date',
+    'TIME': 'time',
+    'LATITUDE': 'latitude',
+    'LONGITUDE': 'longitude',
+    **{col: 'binary' for col in BINARY_COLUMNS},
+    **{col: 'categorical' for col in COLUMNS_TO_LABEL_ENCODE},
+}
+
+# Fields a prediction request must provide; the others fall back to the cleaner's fill values
+REQUIRED_INPUT_FIELDS = ['DATE', 'TIME', 'LATITUDE', 'LONGITUDE']
+
+# Raw input columns that the FeatureEngineer expands into engineered features
+ENGINEERED_FEATURES = {
+    'TIME': ['HOUR'],
+    'DATE': ['MONTH', 'DAY', 'WEEK', 'DAYOFWEEK'],
+}
+
 TARGET = 'ACCLASS'
 
 BINARY_MAPPING = {'YES': 1, 'NO': 0}
@@ -82,4 +102,32 @@ SCORING_METRICS = {
 }
 
 # Random state for reproducibility
-RANDOM_STATE = 48
\ No newline at end of file
+RANDOM_STATE = 48
+
+# Compact dtype mode: narrow integer codes, float32 features and a single
+# contiguous feature matrix through split, sampling and fitting
+COMPACT_DTYPES = False
+
+# Log peak process RSS (plus the tracemalloc Python heap peak) for each stage of the training pipeline
+TRACK_MEMORY = False
+
+# Model registry: raw rows kept with each version to warm and validate it before serving
+CANARY_SIZE = 32
+# Seconds between API checks for a newly published model version
+REGISTRY_POLL_SECONDS = 10
+# Number of published versions kept in the registry; the LATEST and SERVING versions are never pruned
+REGISTRY_KEEP_VERSIONS = 5
+
+# What-if sweeps: maximum number of axes and grid points evaluated per request
+SWEEP_MAX_AXES = 2
+SWEEP_MAX_AXIS_VALUES = 200
+SWEEP_MAX_GRID_SIZE = 10000
+
+# Permutation feature importance after training; opt in with --importance, it can take minutes
+COMPUTE_FEATURE_IMPORTANCE = False
+IMPORTANCE_SCORING = 'f1'
+IMPORTANCE_SAMPLE_SIZE = 2000
+IMPORTANCE_REPEATS_PER_ROUND = 5
+IMPORTANCE_MAX_REPEATS = 50
+# Stop permuting a feature once its 95% CI half-width is below this score difference
+IMPORTANCE_CI_TOLERANCE = 0.005
\ No newline at end of file
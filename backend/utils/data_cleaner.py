@@ -1,5 +1,6 @@
 """Data cleaning transformer for accident data."""
 
+import numpy as np
 import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.preprocessing import LabelEncoder
@@ -8,10 +9,12 @@ from utils.config import BINARY_COLUMNS, BINARY_MAPPING, COLUMNS_TO_DROP, TARGET
 class DataCleaner(BaseEstimator, TransformerMixin):
     """Custom transformer for cleaning the accident data."""
     
-    def __init__(self):
+    def __init__(self, compact: bool = False):
+        self.compact = compact
         self.categorical_cols = []
         self.encoded_categorical_cols = {} 
         self.numerical_cols = []
+        self.numerical_medians = {}
         self.binary_cols = BINARY_COLUMNS
         self.columns_to_drop = COLUMNS_TO_DROP
         self.target_mapping = TARGET_MAPPING
@@ -22,26 +25,47 @@ class DataCleaner(BaseEstimator, TransformerMixin):
         """Drop columns that are not needed."""
         df.drop(columns=self.columns_to_drop, errors='ignore', inplace=True)
         
+    @staticmethod
+    def _is_categorical(values: pd.Series) -> bool:
+        """Whether a column was loaded with the pandas category dtype (compact mode)."""
+        return isinstance(values.dtype, pd.CategoricalDtype)
+
+    def _fill_missing(self, df: pd.DataFrame, col: str, value: str) -> None:
+        """Fill missing values of a column, adding the fill value as a category if needed."""
+        if self._is_categorical(df[col]) and value not in df[col].cat.categories:
+            df[col] = df[col].cat.add_categories([value])
+        df.fillna({ col: value }, inplace=True)
+
     def _convert_strings_to_uppercase(self, df: pd.DataFrame) -> None:
         """Convert all string columns to uppercase."""
         object_columns = df.select_dtypes(include=['object']).columns
         for col in object_columns:
             # Convert to uppercase
             df[col] = df[col].str.upper()
+        for col in df.select_dtypes(include=['category']).columns:
+            # Uppercase each distinct label once; labels differing only in case are merged
+            categories = df[col].cat.categories
+            if not pd.api.types.is_string_dtype(categories):
+                continue
+            upper = categories.str.upper()
+            merged = upper.unique()
+            codes = df[col].cat.codes.to_numpy()
+            remapped = np.where(codes >= 0, merged.get_indexer(upper)[codes], -1)
+            df[col] = pd.Categorical.from_codes(remapped, categories=merged)
             
     def _process_target_variable(self, df: pd.DataFrame) -> None:
         """Process the target variable (ACCLASS) by handling missing values and encoding."""
         if TARGET in df.columns:
             # Fill missing ACCLASS values with 'Fatal'
-            df.fillna({ TARGET : 'FATAL' }, inplace=True)
+            self._fill_missing(df, TARGET, 'FATAL')
             # Drop Property Damage Only records
             df.drop(df[df[TARGET] == 'PROPERTY DAMAGE O'].index, inplace=True)
             # Convert ACCLASS to binary (1 for FATAL, 0 for NON-FATAL)
-            df[TARGET] = df[TARGET].map(self.target_mapping).astype(int)
+            df[TARGET] = df[TARGET].map(self.target_mapping).astype(np.uint8 if self.compact else int)
     
     def _initialize_categorical_cols(self, df: pd.DataFrame) -> None:
         """Initializ categorical columns."""
-        self.categorical_cols = df.select_dtypes(include=['object']).columns
+        self.categorical_cols = df.select_dtypes(include=['object', 'category']).columns
         self.categorical_cols = [col for col in self.categorical_cols if col != TARGET]
 
     def _initialize_numerical_cols(self, df: pd.DataFrame) -> None:
@@ -53,13 +77,16 @@ class DataCleaner(BaseEstimator, TransformerMixin):
         for col in self.binary_cols:
             if col in df.columns:
                 # Fill missing values with 'NO'
-                df.fillna({ col: 'NO' }, inplace=True)
+                self._fill_missing(df, col, 'NO')
     
-    def _fill_missing_values_in_numerical_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Fill missing values in numerical columns."""
+    def _fill_missing_values_in_numerical_columns(self, df: pd.DataFrame, fitting: bool = False) -> pd.DataFrame:
+        """Fill missing values in numerical columns with the medians learned during fitting."""
+        medians = getattr(self, 'numerical_medians', {})
         for col in self.numerical_cols:
             if col in df.columns:
-                median = df[col].median()
+                if fitting:
+                    medians[col] = df[col].median()
+                median = medians[col] if col in medians else df[col].median()
                 # Fill missing values with the median
                 df.fillna({ col: median }, inplace=True)
     
@@ -69,41 +96,102 @@ class DataCleaner(BaseEstimator, TransformerMixin):
             if col in df.columns:
                 # Special handling for columns that need NA filling
                 if col in self.na_fill_cols:
-                    df.fillna({ col: 'NA' }, inplace=True)
+                    self._fill_missing(df, col, 'NA')
                 # Fill missing values with 'OTHER' for other categorical columns    
                 else:
-                    df.fillna({ col: 'OTHER' }, inplace=True)
+                    self._fill_missing(df, col, 'OTHER')
     
     def _transform_binary_columns(self, df: pd.DataFrame) -> pd.DataFrame:
         """Transform binary columns to 0/1 values."""
         for col in self.binary_cols:
             if col in df.columns:
-                df[col] = df[col].map(self.binary_mapping).astype(int)
+                df[col] = df[col].map(self.binary_mapping).astype(np.uint8 if self.compact else int)
+
+    def _encode_with_vocabulary(self, col: str, values: pd.Series, le: LabelEncoder) -> np.ndarray:
+        """Encode values with a fitted encoder; unseen values take the fill category's code."""
+        if self._is_categorical(values):
+            # Look up each distinct label once, then expand through the category codes
+            category_codes = self._encode_with_vocabulary(col, pd.Series(values.cat.categories), le)
+            return category_codes[values.cat.codes.to_numpy()]
+        codes = pd.Index(le.classes_).get_indexer(values)
+        unseen = codes < 0
+        if unseen.any():
+            fill_value = 'NA' if col in self.na_fill_cols else 'OTHER'
+            matches = np.flatnonzero(le.classes_ == fill_value)
+            # Fall back to a code just past the vocabulary when there is no fill category
+            codes[unseen] = matches[0] if len(matches) else len(le.classes_)
+        return codes
 
-    def _transform_categorical_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Transform categorical columns using Label Encoding."""
+    def _transform_categorical_columns(self, df: pd.DataFrame, fitting: bool = False) -> pd.DataFrame:
+        """Transform categorical columns using Label Encoding learned during fitting."""
         for col in self.categorical_cols:
             if col in df.columns:
-                le = LabelEncoder()
-                # Apply label encoding to the column
-                df[col] = le.fit_transform(df[col])
-                # Store the label encoder for future use (if needed)
-                self.encoded_categorical_cols[col] = df[col]
+                le = self.encoded_categorical_cols.get(col)
+                if (fitting or not isinstance(le, LabelEncoder)) and self._is_categorical(df[col]):
+                    # Fit on the labels present in the column rather than on every row
+                    labels = df[col].cat.remove_unused_categories().cat.categories
+                    le = LabelEncoder().fit(labels.to_numpy(dtype=object))
+                    codes = self._encode_with_vocabulary(col, df[col], le)
+                    self.encoded_categorical_cols[col] = le
+                elif fitting or not isinstance(le, LabelEncoder):
+                    le = LabelEncoder()
+                    # Apply label encoding to the column
+                    codes = le.fit_transform(df[col])
+                    # Store the label encoder so later batches share the training vocabulary
+                    self.encoded_categorical_cols[col] = le
+                else:
+                    codes = self._encode_with_vocabulary(col, df[col], le)
+                if self.compact:
+                    # uint8 covers every column except very high cardinality ones (one code kept for unseen values)
+                    codes = codes.astype(np.uint8 if len(le.classes_) < 256 else np.int16)
+                df[col] = codes
+
+    def _downcast_numerical_columns(self, df: pd.DataFrame) -> None:
+        """Downcast remaining numerical columns to float32/int16 in compact mode."""
+        for col in df.select_dtypes(include=['floating']).columns:
+            df[col] = df[col].astype(np.float32)
+        # Time features (hour, day, week, ...) normally fit in int16; other columns keep their dtype
+        int16_info = np.iinfo(np.int16)
+        for col in df.select_dtypes(include=['integer']).columns:
+            if df[col].dtype.itemsize > 2 and col not in self.binary_cols and col != TARGET:
+                values = df[col]
+                if values.isna().any() or len(values) == 0:
+                    continue
+                if int16_info.min <= values.min() and values.max() <= int16_info.max:
+                    df[col] = values.astype(np.int16)
     
     def fit(self, df: pd.DataFrame) -> 'DataCleaner':
         """Fit the data cleaner."""
+        # Vocabularies and medians are learned on cleaned values, so fit on a copy
+        self.fit_transform(df.copy())
+        return self
+
+    def fit_transform(self, df: pd.DataFrame, y: None = None) -> pd.DataFrame:
+        """Fit the data cleaner and transform the data in a single in-place pass."""
         self._initialize_categorical_cols(df)      
         self._initialize_numerical_cols(df)
-        return self
+        self.numerical_medians = {}
+        self.encoded_categorical_cols = {}
+        return self._clean(df, fitting=True)
+
+    def __sklearn_is_fitted__(self) -> bool:
+        """Fitted once the column groups have been initialized."""
+        return len(self.categorical_cols) > 0 or len(self.numerical_cols) > 0
     
     def transform(self, df: pd.DataFrame) -> pd.DataFrame:
         """Transform the data."""
+        return self._clean(df, fitting=False)
+
+    def _clean(self, df: pd.DataFrame, fitting: bool) -> pd.DataFrame:
+        """Run the cleaning steps, learning medians and vocabularies when fitting."""
         self._drop_unnecessary_columns(df)
         self._convert_strings_to_uppercase(df)
         self._process_target_variable(df)
         self._fill_missing_values_in_binary_columns(df)
-        self._fill_missing_values_in_numerical_columns(df)
+        self._fill_missing_values_in_numerical_columns(df, fitting)
         self._fill_missing_values_in_categorical_columns(df)
         self._transform_binary_columns(df)
-        self._transform_categorical_columns(df)
+        self._transform_categorical_columns(df, fitting)
+        if self.compact:
+            self._downcast_numerical_columns(df)
         return df
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""Parallel permutation feature importance with confidence-interval early stopping."""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+import numpy as np
+import pandas as pd
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import train_test_split
+from utils.config import (IMPORTANCE_CI_TOLERANCE, IMPORTANCE_MAX_REPEATS, IMPORTANCE_REPEATS_PER_ROUND,
+                          IMPORTANCE_SAMPLE_SIZE, IMPORTANCE_SCORING, RANDOM_STATE)
+
+# Per-worker state, set once by the pool initializer so tasks only ship indices
+_worker_state = {}
+
+def _init_worker(model: Any, X: np.ndarray, y: np.ndarray, columns: list[str], scoring: str) -> None:
+    """Load the model and sample into the worker process."""
+    _worker_state['model'] = model
+    _worker_state['X'] = X
+    # Zero-copy view: permuting a column of X in place is visible to the model
+    _worker_state['frame'] = pd.DataFrame(X, columns=columns, copy=False)
+    _worker_state['y'] = y
+    _worker_state['scorer'] = get_scorer(scoring)
+
+def _permutation_drops(feature_idx: int, round_idx: int, n_repeats: int, baseline: float) -> tuple[int, list[float]]:
+    """Score drops from permuting one feature n_repeats times."""
+    model, X, frame, y, scorer = (_worker_state[key] for key in ('model', 'X', 'frame', 'y', 'scorer'))
+    rng = np.random.default_rng([RANDOM_STATE, feature_idx, round_idx])
+    original = X[:, feature_idx].copy()
+    drops = []
+    try:
+        for _ in range(n_repeats):
+            X[:, feature_idx] = rng.permutation(original)
+            drops.append(baseline - scorer(model, frame, y))
+    finally:
+        X[:, feature_idx] = original
+    return feature_idx, drops
+
+def _ci_half_width(drops: list[float]) -> float:
+    """Half-width of the normal-approximation 95% confidence interval of the mean drop."""
+    if len(drops) < 2:
+        return np.inf
+    return 1.96 * np.std(drops, ddof=1) / np.sqrt(len(drops))
+
+def stratified_sample(X: pd.DataFrame, y: np.ndarray, size: int = IMPORTANCE_SAMPLE_SIZE) -> tuple[pd.DataFrame, np.ndarray]:
+    """Take a class-stratified subsample of at most size rows."""
+    if len(X) <= size:
+        return X, np.asarray(y)
+    X_sample, _, y_sample, _ = train_test_split(X, y, train_size=size, stratify=y, random_state=RANDOM_STATE)
+    return X_sample, np.asarray(y_sample)
+
+def compute_permutation_importance(model: Any, X: pd.DataFrame, y: np.ndarray,
+                                   n_jobs: Optional[int] = None) -> tuple[pd.DataFrame, dict]:
+    """Compute permutation importance per feature across a process pool.
+
+    Features are permuted in rounds of IMPORTANCE_REPEATS_PER_ROUND; a feature stops
+    once its 95% confidence interval half-width falls below IMPORTANCE_CI_TOLERANCE
+    or it reaches IMPORTANCE_MAX_REPEATS.
+
+    Returns:
+        tuple: Importance DataFrame sorted by importance, and a summary of the run
+    """
+    X_sample, y_sample = stratified_sample(X, y)
+    columns = X_sample.columns.tolist()
+    # Numeric, writable copy: workers permute its columns in place. Nullable integer
+    # columns (e.g. WEEK) would otherwise make to_numpy return an object array.
+    dtype = np.float32 if (X_sample.dtypes == np.float32).all() else np.float64
+    X_array = np.array(X_sample.to_numpy(dtype=dtype), order='C')
+    scorer = get_scorer(IMPORTANCE_SCORING)
+    baseline = scorer(model, pd.DataFrame(X_array, columns=columns, copy=False), y_sample)
+    n_jobs = n_jobs or os.cpu_count() or 1
+    logging.info(f"Computing permutation importance for {len(columns)} features on {len(y_sample)} rows "
+                 f"with {n_jobs} workers (baseline {IMPORTANCE_SCORING}: {baseline:.4f})...")
+
+    drops = {idx: [] for idx in range(len(columns))}
+    pending = list(drops)
+    round_idx = 0
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                             initargs=(model, X_array, y_sample, columns, IMPORTANCE_SCORING)) as executor:
+        while pending:
+            futures = [executor.submit(_permutation_drops, idx, round_idx, IMPORTANCE_REPEATS_PER_ROUND, baseline)
+                       for idx in pending]
+            for future in futures:
+                idx, feature_drops = future.result()
+                drops[idx].extend(feature_drops)
+            pending = [idx for idx in pending
+                       if _ci_half_width(drops[idx]) > IMPORTANCE_CI_TOLERANCE
+                       and len(drops[idx]) < IMPORTANCE_MAX_REPEATS]
+            round_idx += 1
+            logging.info(f"Permutation importance round {round_idx}: {len(pending)} features not yet stable")
+
+    records = []
+    for idx, feature_drops in drops.items():
+        mean = float(np.mean(feature_drops))
+        half_width = float(_ci_half_width(feature_drops))
+        records.append({
+            'feature': columns[idx],
+            'importance': mean,
+            'std': float(np.std(feature_drops, ddof=1)) if len(feature_drops) > 1 else 0.0,
+            'ci_low': mean - half_width,
+            'ci_high': mean + half_width,
+            'repeats': len(feature_drops),
+        })
+    importance_df = pd.DataFrame(records).sort_values('importance', ascending=False).reset_index(drop=True)
+    summary = {'scoring': IMPORTANCE_SCORING, 'baseline_score': float(baseline),
+               'sample_size': int(len(y_sample)), 'rounds': round_idx}
+    return importance_df, summary
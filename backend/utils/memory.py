@@ -0,0 +1,109 @@
+"""Peak memory tracking for the training pipeline stages."""
+
+import logging
+import os
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover - /proc is used on Linux
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+# Seconds between RSS samples while a stage runs
+RSS_SAMPLE_INTERVAL = 0.01
+
+def _current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, including memory allocated directly by C extensions."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _max_rss_bytes() -> Optional[int]:
+    """Process-lifetime RSS high-water mark from getrusage."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return max_rss if os.uname().sysname == 'Darwin' else max_rss * 1024
+
+class _RssSampler(threading.Thread):
+    """Track the highest RSS observed while a stage runs."""
+
+    def __init__(self):
+        super().__init__(name='rss-sampler', daemon=True)
+        self.peak = _current_rss_bytes() or 0
+        self._stop_event = threading.Event()
+
+    def stop(self) -> int:
+        """Stop sampling and return the peak RSS in bytes."""
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, _current_rss_bytes() or 0)
+        return self.peak
+
+    def run(self) -> None:
+        while not self._stop_event.wait(RSS_SAMPLE_INTERVAL):
+            self.peak = max(self.peak, _current_rss_bytes() or 0)
+
+class MemoryTracker:
+    """Record peak process RSS per named pipeline stage.
+
+    RSS covers memory that pandas, scikit-learn and NumPy allocate directly in C.
+    The tracemalloc peak is reported alongside as the Python heap figure only.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.stages = {}
+
+    def start(self) -> None:
+        """Start tracing Python heap allocations."""
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self) -> None:
+        """Stop tracing and log a summary of all recorded stages."""
+        if not self.enabled:
+            return
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        logging.info("Peak memory per stage (process RSS; Python heap from tracemalloc):")
+        for name, (rss_peak, rss_delta, heap_peak) in self.stages.items():
+            logging.info(f"  {name:<20} RSS peak {rss_peak:>10.1f} MiB  (+{rss_delta:>8.1f} MiB)  "
+                         f"Python heap peak {heap_peak:>8.1f} MiB")
+        max_rss = _max_rss_bytes()
+        if max_rss is not None:
+            logging.info(f"Process RSS high-water mark (ru_maxrss): {max_rss / 2**20:.1f} MiB")
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Measure the peak RSS and Python heap while the block runs."""
+        if not self.enabled:
+            yield
+            return
+        start_rss = _current_rss_bytes() or 0
+        sampler = _RssSampler()
+        sampler.start()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            rss_peak = sampler.stop() / 2**20
+            rss_delta = max(rss_peak - start_rss / 2**20, 0.0)
+            heap_peak = tracemalloc.get_traced_memory()[1] / 2**20 if tracemalloc.is_tracing() else 0.0
+            self.stages[name] = (rss_peak, rss_delta, heap_peak)
+            logging.info(f"[memory] {name}: RSS peak {rss_peak:.1f} MiB (+{rss_delta:.1f} MiB over stage start), "
+                         f"Python heap peak {heap_peak:.1f} MiB (tracemalloc)")
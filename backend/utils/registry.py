@@ -0,0 +1,251 @@
+"""Versioned model registry: publishing, loading and hot reloading of trained artifacts."""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, NamedTuple, Optional
+import joblib
+import numpy as np
+import pandas as pd
+from utils.config import REGISTRY_DIR, REGISTRY_KEEP_VERSIONS, REGISTRY_POLL_SECONDS
+from utils.request_decoder import RequestDecoder, verify_decoder
+
+MODEL_FILE = 'model.pkl'
+PIPELINE_FILE = 'preprocessing_pipeline.pkl'
+CANARY_FILE = 'canary.json'
+MANIFEST_FILE = 'manifest.json'
+FEATURE_IMPORTANCE_FILE = 'feature_importance.json'
+LATEST_FILE = 'LATEST'
+SERVING_FILE = 'SERVING'
+
+class LoadedVersion(NamedTuple):
+    """A loaded model version; swapped as a single reference so requests see a consistent pair."""
+    version: str
+    model: Any
+    pipeline: Any
+    manifest: dict
+    decoder: Optional[RequestDecoder] = None
+
+def _sha256(path: Path) -> str:
+    """Compute the SHA-256 digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _json_safe_metrics(metrics: dict) -> dict:
+    """Keep the JSON-serializable parts of the evaluate_model metrics."""
+    safe = {}
+    for key in ('accuracy', 'roc_auc', 'average_precision'):
+        if key in metrics:
+            safe[key] = float(metrics[key])
+    if 'confusion_matrix' in metrics:
+        safe['confusion_matrix'] = np.asarray(metrics['confusion_matrix']).tolist()
+    if 'classification_report_dict' in metrics:
+        safe['classification_report'] = json.loads(json.dumps(metrics['classification_report_dict'], default=float))
+    return safe
+
+def _write_atomic(path: Path, text: str) -> None:
+    """Write a small text file so readers never observe a partial write."""
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
+
+def _predict_canary(model: Any, pipeline: Any, canary_records: list[dict]) -> list[int]:
+    """Run the canary batch through the pipeline and model."""
+    # The pipeline transforms in place, so always start from a fresh frame
+    processed = pipeline.transform(pd.DataFrame(canary_records))
+    return [int(p) for p in model.predict(processed)]
+
+def publish_version(model: Any, pipeline: Any, metrics: dict, feature_columns: list[str],
+                    canary_df: pd.DataFrame, feature_importance: Optional[dict] = None) -> str:
+    """Publish trained artifacts as a new immutable registry version and mark it as latest."""
+    version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+    staging_dir = REGISTRY_DIR / f'.{version}.staging'
+    staging_dir.mkdir()
+    try:
+        canary_records = json.loads(canary_df.to_json(orient='records'))
+        joblib.dump(model, staging_dir / MODEL_FILE)
+        joblib.dump(pipeline, staging_dir / PIPELINE_FILE)
+        (staging_dir / CANARY_FILE).write_text(json.dumps(canary_records))
+        artifact_names = [MODEL_FILE, PIPELINE_FILE, CANARY_FILE]
+        if feature_importance is not None:
+            (staging_dir / FEATURE_IMPORTANCE_FILE).write_text(json.dumps(feature_importance, indent=2))
+            artifact_names.append(FEATURE_IMPORTANCE_FILE)
+
+        manifest = {
+            'version': version,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'artifacts': {name: _sha256(staging_dir / name) for name in artifact_names},
+            'metrics': _json_safe_metrics(metrics),
+            'feature_schema': {
+                'input_columns': canary_df.columns.tolist(),
+                'feature_columns': list(feature_columns),
+            },
+            'canary': {
+                'size': len(canary_records),
+                'predictions': _predict_canary(model, pipeline, canary_records),
+            },
+        }
+        (staging_dir / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+        # Renaming the complete directory makes the version appear atomically
+        os.replace(staging_dir, REGISTRY_DIR / version)
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    _write_atomic(REGISTRY_DIR / LATEST_FILE, version)
+    logging.info(f"Published model version {version} to {REGISTRY_DIR / version}")
+    prune_versions()
+    return version
+
+def list_versions() -> list[str]:
+    """Published versions, oldest first (version names sort chronologically)."""
+    if not REGISTRY_DIR.exists():
+        return []
+    return sorted(path.name for path in REGISTRY_DIR.iterdir()
+                  if path.is_dir() and not path.name.startswith('.'))
+
+def prune_versions(keep: int = REGISTRY_KEEP_VERSIONS) -> list[str]:
+    """Delete all but the newest keep versions, never touching the ones named in LATEST or SERVING."""
+    protected = {get_latest_version(), get_serving_version()}
+    versions = list_versions()
+    to_delete = [version for version in versions[:max(len(versions) - keep, 0)] if version not in protected]
+    for version in to_delete:
+        shutil.rmtree(REGISTRY_DIR / version, ignore_errors=True)
+        logging.info(f"Pruned model version {version}")
+    return to_delete
+
+def get_latest_version() -> Optional[str]:
+    """Return the latest published version, or None if nothing has been published."""
+    latest_path = REGISTRY_DIR / LATEST_FILE
+    if not latest_path.exists():
+        return None
+    return latest_path.read_text().strip() or None
+
+def get_serving_version() -> Optional[str]:
+    """Return the version the API last validated and swapped in, or None."""
+    serving_path = REGISTRY_DIR / SERVING_FILE
+    if not serving_path.exists():
+        return None
+    return serving_path.read_text().strip() or None
+
+def mark_serving(version: str) -> None:
+    """Record the version the API is serving so pruning keeps it on disk."""
+    REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+    _write_atomic(REGISTRY_DIR / SERVING_FILE, version)
+
+def load_version(version: str) -> LoadedVersion:
+    """Load a published version, verifying artifact hashes against its manifest."""
+    version_dir = REGISTRY_DIR / version
+    manifest = json.loads((version_dir / MANIFEST_FILE).read_text())
+    for name, expected in manifest['artifacts'].items():
+        actual = _sha256(version_dir / name)
+        if actual != expected:
+            raise ValueError(f"Hash mismatch for {name} in version {version}: expected {expected}, got {actual}")
+    model = joblib.load(version_dir / MODEL_FILE)
+    pipeline = joblib.load(version_dir / PIPELINE_FILE)
+    return LoadedVersion(version, model, pipeline, manifest,
+                         compile_decoder(pipeline, manifest['feature_schema']['feature_columns']))
+
+def compile_decoder(pipeline: Any, feature_columns: list[str]) -> Optional[RequestDecoder]:
+    """Compile the fast request decoder, or return None so requests use the pipeline."""
+    try:
+        return RequestDecoder(pipeline, feature_columns)
+    except Exception as e:
+        logging.warning(f"Fast request decoding disabled, falling back to the preprocessing pipeline: {e}")
+        return None
+
+@lru_cache(maxsize=8)
+def load_feature_importance(version: str) -> Optional[dict]:
+    """Load the cached feature importance of a version, or None if it was not computed."""
+    importance_path = REGISTRY_DIR / version / FEATURE_IMPORTANCE_FILE
+    if not importance_path.exists():
+        return None
+    return json.loads(importance_path.read_text())
+
+def validate_version(loaded: LoadedVersion) -> LoadedVersion:
+    """Warm a loaded version on its canary batch and check it reproduces the recorded predictions.
+
+    Also checks that the fast request decoder matches the preprocessing pipeline on the
+    canary rows; if it does not, the returned version serves requests through the pipeline.
+    """
+    canary_records = json.loads((REGISTRY_DIR / loaded.version / CANARY_FILE).read_text())
+    predictions = _predict_canary(loaded.model, loaded.pipeline, canary_records)
+    expected = loaded.manifest['canary']['predictions']
+    if predictions != expected:
+        mismatches = sum(p != e for p, e in zip(predictions, expected))
+        raise ValueError(f"Canary validation failed for version {loaded.version}: "
+                         f"{mismatches}/{len(expected)} predictions differ")
+
+    if loaded.decoder is not None:
+        try:
+            matches = verify_decoder(loaded.decoder, loaded.pipeline, canary_records)
+        except Exception as e:
+            logging.warning(f"Fast request decoder failed on the canary batch: {e}")
+            matches = False
+        if not matches:
+            logging.warning(f"Fast request decoder does not match the pipeline for version {loaded.version}; disabled.")
+            return loaded._replace(decoder=None)
+    return loaded
+
+def load_newest_valid_version() -> Optional[LoadedVersion]:
+    """Load LATEST, or failing that the newest older version that passes validation."""
+    latest = get_latest_version()
+    older = [version for version in reversed(list_versions()) if latest is None or version < latest]
+    for version in ([latest] if latest else []) + older:
+        try:
+            loaded = validate_version(load_version(version))
+        except Exception as e:
+            logging.error(f"Model version {version} failed validation: {e}")
+            continue
+        if version != latest:
+            logging.warning(f"Serving model version {version} because {latest} failed validation.")
+        return loaded
+    return None
+
+class RegistryWatcher(threading.Thread):
+    """Background thread that loads, validates and hands over newly published versions."""
+
+    def __init__(self, current_version: Optional[str], on_new_version: Callable[[LoadedVersion], None],
+                 poll_seconds: float = REGISTRY_POLL_SECONDS):
+        super().__init__(name='registry-watcher', daemon=True)
+        self.current_version = current_version
+        self.on_new_version = on_new_version
+        self.poll_seconds = poll_seconds
+        self.rejected_versions = set()
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        """Ask the watcher to exit after its current poll."""
+        self._stop_event.set()
+
+    def check_once(self) -> None:
+        """Load and hand over the latest version if it is new and passes validation."""
+        latest = get_latest_version()
+        if latest is None or latest == self.current_version or latest in self.rejected_versions:
+            return
+        logging.info(f"New model version {latest} detected, loading in background...")
+        try:
+            loaded = validate_version(load_version(latest))
+        except Exception as e:
+            logging.error(f"Rejected model version {latest}: {e}", exc_info=True)
+            self.rejected_versions.add(latest)
+            return
+        self.on_new_version(loaded)
+        self.current_version = latest
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.poll_seconds):
+            try:
+                self.check_once()
+            except Exception as e:
+                logging.error(f"Error while checking the model registry: {e}", exc_info=True)
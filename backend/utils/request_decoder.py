@@ -0,0 +1,217 @@
+"""Prediction request decoder compiled from the CollisionInput schema and the fitted pipeline.
+
+Decodes JSON payloads straight into a NumPy feature matrix, reproducing what
+FeatureEngineer and DataCleaner would compute without building DataFrames.
+"""
+
+import json
+import math
+from datetime import date, datetime
+from typing import Any, Callable
+import numpy as np
+import pandas as pd
+from utils.config import BINARY_MAPPING, COLLISION_INPUT_SCHEMA, ENGINEERED_FEATURES, REQUIRED_INPUT_FIELDS
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+class RequestValidationError(ValueError):
+    """Raised when a request payload does not match the CollisionInput schema."""
+
+    def __init__(self, errors: list[dict]):
+        super().__init__(f"{len(errors)} invalid field(s) in request")
+        self.errors = errors
+
+def parse_json(body: bytes) -> Any:
+    """Parse a JSON request body, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+def _is_missing(value: Any) -> bool:
+    """Missing the way pandas sees it after building a DataFrame from the payload."""
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+def _parse_date(value: Any) -> date:
+    """Parse a DATE value, trying ISO format before falling back to pandas."""
+    if not isinstance(value, str):
+        raise ValueError("must be a date string")
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        pass
+    try:
+        return pd.Timestamp(value).date()
+    except (ValueError, TypeError):
+        raise ValueError(f"could not parse date '{value}'") from None
+
+def _parse_hour(value: Any) -> int:
+    """Extract the hour from an HHMM TIME value, as FeatureEngineer does."""
+    text = str(value)
+    if isinstance(value, bool) or not text.isdigit() or len(text) > 4:
+        raise ValueError("must be an HHMM time such as '1430'")
+    hour = int(text.zfill(4)[:2])
+    if hour > 23:
+        raise ValueError(f"'{value}' is not a valid time of day")
+    return hour
+
+class RequestDecoder:
+    """Decode CollisionInput payloads into feature rows for a fitted preprocessing pipeline."""
+
+    def __init__(self, pipeline: Any, feature_columns: list[str]):
+        cleaner = pipeline.named_steps['cleaner']
+        self.feature_columns = list(feature_columns)
+        self._index = {col: i for i, col in enumerate(self.feature_columns)}
+        self._medians = dict(getattr(cleaner, 'numerical_medians', {}))
+        self._na_fill_cols = set(cleaner.na_fill_cols)
+        self._binary_mapping = {key.upper(): value for key, value in BINARY_MAPPING.items()}
+
+        # Fitted vocabularies: value -> code, plus the code used for unseen values
+        self._vocabularies = {}
+        self._unseen_codes = {}
+        for col, encoder in cleaner.encoded_categorical_cols.items():
+            if not hasattr(encoder, 'classes_'):
+                raise ValueError(f"Pipeline has no fitted vocabulary for '{col}'")
+            vocabulary = {value: code for code, value in enumerate(encoder.classes_.tolist())}
+            fill_value = 'NA' if col in self._na_fill_cols else 'OTHER'
+            self._vocabularies[col] = vocabulary
+            self._unseen_codes[col] = vocabulary.get(fill_value, len(vocabulary))
+
+        self._field_decoders = {field: self._compile_field(field, kind)
+                                for field, kind in COLLISION_INPUT_SCHEMA.items()}
+        covered = {col for field in COLLISION_INPUT_SCHEMA for col in ENGINEERED_FEATURES.get(field, [field])}
+        uncovered = [col for col in self.feature_columns if col not in covered]
+        if uncovered:
+            raise ValueError(f"Request schema does not produce feature(s) {uncovered}")
+
+    def _encode(self, col: str, value: Any) -> int:
+        """Look up a cleaned value in the fitted vocabulary of a column."""
+        return self._vocabularies[col].get(value, self._unseen_codes[col])
+
+    def _compile_field(self, field: str, kind: str) -> Callable[[Any, np.ndarray], None]:
+        """Build the function that validates one field and writes its features into a row."""
+        index = self._index
+
+        if kind == 'date':
+            targets = [(col, index[col]) for col in ENGINEERED_FEATURES['DATE'] if col in index]
+            extractors = {
+                'MONTH': lambda d: d.month,
+                'DAY': lambda d: d.day,
+                'WEEK': lambda d: d.isocalendar()[1],
+                'DAYOFWEEK': lambda d: d.weekday(),
+            }
+            def decode_date(value: Any, row: np.ndarray) -> None:
+                parsed = _parse_date(value)
+                for col, i in targets:
+                    row[i] = extractors[col](parsed)
+            return decode_date
+
+        if kind == 'time':
+            hour_idx = index.get('HOUR')
+            def decode_time(value: Any, row: np.ndarray) -> None:
+                hour = _parse_hour(value)
+                if hour_idx is not None:
+                    row[hour_idx] = hour
+            return decode_time
+
+        if kind in ('latitude', 'longitude'):
+            limit = 90 if kind == 'latitude' else 180
+            i = index.get(field)
+            median = self._medians.get(field, math.nan)
+            def decode_coordinate(value: Any, row: np.ndarray) -> None:
+                if _is_missing(value):
+                    number = median
+                else:
+                    try:
+                        number = float(value)
+                    except (TypeError, ValueError):
+                        raise ValueError("must be a number") from None
+                    if not -limit <= number <= limit:
+                        raise ValueError(f"must be between -{limit} and {limit}")
+                if i is not None:
+                    row[i] = number
+            return decode_coordinate
+
+        i = index.get(field)
+        encoded = field in self._vocabularies
+        if kind == 'categorical' and i is not None and not encoded:
+            raise ValueError(f"Pipeline has no fitted vocabulary for '{field}'")
+        if kind == 'binary':
+            def decode_binary(value: Any, row: np.ndarray) -> None:
+                if _is_missing(value):
+                    value = 'NO'
+                if not isinstance(value, str) or value.upper() not in self._binary_mapping:
+                    raise ValueError("must be 'YES' or 'NO'")
+                mapped = self._binary_mapping[value.upper()]
+                if i is not None:
+                    row[i] = self._encode(field, mapped) if encoded else mapped
+            return decode_binary
+
+        fill_value = 'NA' if field in self._na_fill_cols else 'OTHER'
+        def decode_categorical(value: Any, row: np.ndarray) -> None:
+            if _is_missing(value):
+                value = fill_value
+            if not isinstance(value, str):
+                raise ValueError("must be a string")
+            if i is not None:
+                row[i] = self._encode(field, value.upper())
+        return decode_categorical
+
+    def decode(self, payload: Any) -> np.ndarray:
+        """Validate a payload (one record or a list of records) and decode it into a feature matrix.
+
+        Fields outside the schema are ignored, as the pipeline path drops them when it
+        selects the feature columns.
+        """
+        records = payload if isinstance(payload, list) else [payload]
+        if not records:
+            raise RequestValidationError([{'row': None, 'field': None, 'message': "payload contains no records"}])
+
+        X = np.empty((len(records), len(self.feature_columns)), dtype=np.float64)
+        errors = []
+        for row_idx, record in enumerate(records):
+            if not isinstance(record, dict):
+                errors.append({'row': row_idx, 'field': None, 'message': "record must be a JSON object"})
+                continue
+            for field in REQUIRED_INPUT_FIELDS:
+                if _is_missing(record.get(field)):
+                    errors.append({'row': row_idx, 'field': field, 'message': "is required"})
+            for field, decode_field in self._field_decoders.items():
+                value = record.get(field)
+                if field in REQUIRED_INPUT_FIELDS and _is_missing(value):
+                    continue
+                try:
+                    decode_field(value, X[row_idx])
+                except ValueError as e:
+                    errors.append({'row': row_idx, 'field': field, 'message': str(e)})
+        if errors:
+            raise RequestValidationError(errors)
+        return X
+
+    def to_frame(self, X: np.ndarray) -> pd.DataFrame:
+        """Wrap decoded features with the model's feature names, without copying."""
+        return pd.DataFrame(X, columns=self.feature_columns, copy=False)
+
+def _edge_case_records(record: dict) -> list[dict]:
+    """Variants of a record with missing, empty and unseen values in each optional field."""
+    variants = []
+    for field, kind in COLLISION_INPUT_SCHEMA.items():
+        if field in REQUIRED_INPUT_FIELDS:
+            continue
+        replacements = [None, '', 'UNSEEN VALUE'] if kind == 'categorical' else [None]
+        variants.extend({**record, field: value} for value in replacements)
+    return variants
+
+def verify_decoder(decoder: RequestDecoder, pipeline: Any, records: list[dict]) -> bool:
+    """Check that the decoder reproduces preprocessing_pipeline.transform on sample records.
+
+    Edge-case variants of the first record are checked too, so the fallback paths for
+    missing, empty and unseen values are compared against the pipeline as well.
+    """
+    if records:
+        records = records + _edge_case_records(records[0])
+    fast = decoder.decode(records)
+    reference = pipeline.transform(pd.DataFrame(records))[decoder.feature_columns].to_numpy(dtype=np.float64)
+    return np.allclose(fast, reference, rtol=1e-6, atol=1e-6)
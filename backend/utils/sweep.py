@@ -0,0 +1,121 @@
+"""What-if sweeps: evaluate a base collision over a grid of varied input values in one batch."""
+
+from typing import Any, Optional
+import numpy as np
+import pandas as pd
+from utils.config import (BINARY_COLUMNS, BINARY_MAPPING, COLLISION_INPUT_SCHEMA, ENGINEERED_FEATURES,
+                          SWEEP_MAX_AXES, SWEEP_MAX_AXIS_VALUES, SWEEP_MAX_GRID_SIZE)
+
+def _default_axis_values(field: str, pipeline: Any) -> list:
+    """Values swept when the request does not list them explicitly."""
+    if field == 'TIME':
+        # Every hour of the day, as HHMM strings
+        return [f"{hour:02d}00" for hour in range(24)]
+    if field in BINARY_COLUMNS:
+        return ['YES', 'NO']
+    encoder = pipeline.named_steps['cleaner'].encoded_categorical_cols.get(field)
+    if hasattr(encoder, 'classes_'):
+        # Every category seen during training
+        return [str(value) for value in encoder.classes_]
+    raise ValueError(f"Axis '{field}' needs explicit 'values'.")
+
+def _validate_axis_values(field: str, values: Any, pipeline: Any) -> list:
+    """Check explicit axis values: a non-empty list of scalars known to the fitted pipeline."""
+    if not isinstance(values, list) or not values:
+        raise ValueError(f"Axis '{field}' values must be a non-empty list.")
+    if len(values) > SWEEP_MAX_AXIS_VALUES:
+        raise ValueError(f"Axis '{field}' has {len(values)} values, the maximum is {SWEEP_MAX_AXIS_VALUES}.")
+    if any(isinstance(value, (dict, list, bool)) or value is None for value in values):
+        raise ValueError(f"Axis '{field}' values must be strings or numbers.")
+
+    if field in BINARY_COLUMNS:
+        allowed = set(BINARY_MAPPING)
+    else:
+        encoder = pipeline.named_steps['cleaner'].encoded_categorical_cols.get(field)
+        allowed = {str(value) for value in encoder.classes_} if hasattr(encoder, 'classes_') else None
+    if allowed is not None:
+        # Unknown values would silently take the OTHER/NA code and duplicate that grid point
+        unknown = [value for value in values if str(value).upper() not in allowed]
+        if unknown:
+            raise ValueError(f"Axis '{field}' has values not seen during training: {unknown}")
+    return list(values)
+
+def resolve_axes(base: dict, axes: list[dict], pipeline: Any) -> list[tuple[str, list]]:
+    """Validate the requested axes and fill in default values."""
+    if not isinstance(axes, list) or not 1 <= len(axes) <= SWEEP_MAX_AXES:
+        raise ValueError(f"'axes' must be a list of 1 to {SWEEP_MAX_AXES} axes.")
+    resolved = []
+    for axis in axes:
+        field = axis.get('field') if isinstance(axis, dict) else None
+        if field not in COLLISION_INPUT_SCHEMA:
+            raise ValueError(f"Axis field '{field}' is not a collision input field.")
+        if field in (f for f, _ in resolved):
+            raise ValueError(f"Axis field '{field}' is used more than once.")
+        if 'values' in axis:
+            values = _validate_axis_values(field, axis['values'], pipeline)
+        else:
+            values = _default_axis_values(field, pipeline)[:SWEEP_MAX_AXIS_VALUES]
+        resolved.append((field, values))
+
+    grid_size = int(np.prod([len(values) for _, values in resolved]))
+    if grid_size > SWEEP_MAX_GRID_SIZE:
+        raise ValueError(f"Sweep grid has {grid_size} points, the maximum is {SWEEP_MAX_GRID_SIZE}.")
+    return resolved
+
+def build_sweep_grid(base: dict, axes: list[tuple[str, list]], pipeline: Any,
+                     feature_columns: list[str]) -> pd.DataFrame:
+    """Build the processed feature grid for every combination of axis values.
+
+    The base row and each distinct axis value are preprocessed once, in a single
+    small batch; the full grid is then assembled with NumPy broadcasting.
+    """
+    rows = [base]
+    for field, values in axes:
+        rows.extend({**base, field: value} for value in values)
+    processed = pipeline.transform(pd.DataFrame(rows))[feature_columns].to_numpy(dtype=np.float64)
+
+    base_row, offset = processed[0], 1
+    sizes = [len(values) for _, values in axes]
+    grid = np.repeat(base_row[np.newaxis, :], int(np.prod(sizes)), axis=0)
+    for i, (field, values) in enumerate(axes):
+        variants = processed[offset:offset + len(values)]
+        offset += len(values)
+        column_idx = [feature_columns.index(col) for col in ENGINEERED_FEATURES.get(field, [field])
+                      if col in feature_columns]
+        # Axis i varies slowest-to-fastest in row-major grid order
+        inner = int(np.prod(sizes[i + 1:]))
+        outer = int(np.prod(sizes[:i]))
+        expanded = np.tile(np.repeat(variants[:, column_idx], inner, axis=0), (outer, 1))
+        grid[:, column_idx] = expanded
+    return pd.DataFrame(grid, columns=feature_columns, copy=False)
+
+def predict_with_probability(model: Any, X: pd.DataFrame) -> tuple[np.ndarray, Optional[np.ndarray]]:
+    """Predictions and fatal-class probabilities, scoring each ensemble member only once.
+
+    Hard-voting ensembles have no predict_proba, so each member's probabilities give
+    both its vote for the majority prediction and the averaged fatal probability.
+    """
+    if hasattr(model, 'predict_proba'):
+        proba = model.predict_proba(X)
+        return model.classes_[np.argmax(proba, axis=1)], proba[:, 1]
+    members = getattr(model, 'estimators_', None)
+    label_encoder = getattr(model, 'le_', None)
+    if not members or label_encoder is None:
+        return model.predict(X), None
+
+    weights = model.weights
+    if weights is not None:
+        weights = [w for (_, est), w in zip(model.estimators, weights) if est != 'drop']
+    votes = np.zeros((len(X), len(label_encoder.classes_)))
+    member_probas = []
+    for i, est in enumerate(members):
+        if hasattr(est, 'predict_proba'):
+            proba = est.predict_proba(X)
+            member_probas.append(proba[:, 1])
+            member_votes = est.classes_[np.argmax(proba, axis=1)]
+        else:
+            member_votes = est.predict(X)
+        votes[np.arange(len(X)), member_votes.astype(int)] += 1 if weights is None else weights[i]
+    # Ties go to the lowest encoded class, as in VotingClassifier.predict
+    prediction = label_encoder.inverse_transform(np.argmax(votes, axis=1))
+    return prediction, np.mean(member_probas, axis=0) if member_probas else None